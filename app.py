@@ -1,291 +1,185 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, request, current_app
 from flask_cors import CORS
 import os
-import json
-import html
-import logging
 import requests
 import re
-from datetime import datetime
-from functools import wraps
-import time
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Initialize Flask app
-app = Flask(__name__)
+from config import config
+from middleware.caching import body_etag, cacheable
+from middleware.security import SecurityMiddleware
+from store import comment_store
+from utils.cache import TTLCache
+from utils.json_provider import OrjsonProvider
+from utils.logger import setup_logging
+from utils.responses import make_json_response, make_static_response, make_timestamped_response, mark_cache_status
+from utils.timestamps import now_iso
+from utils.validators import sanitize_input, validate_comment_data
 
-# Load configuration based on environment
-env = os.getenv('FLASK_ENV', 'development')
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['DEBUG'] = env == 'development'
-app.config['TESTING'] = env == 'testing'
-app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
-app.config['WEATHER_API_KEY'] = os.environ.get('WEATHER_API_KEY', 'demo-key')
+api = Blueprint('api', __name__)
 
-# Security headers configuration
-app.config['SECURITY_HEADERS'] = {
-    'X-Content-Type-Options': 'nosniff',
-    'X-Frame-Options': 'DENY',
-    'X-XSS-Protection': '1; mode=block',
-    'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
-    'Content-Security-Policy': "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline';",
-    'Referrer-Policy': 'strict-origin-when-cross-origin'
+# Per-endpoint (max requests per hour, required JSON fields), enforced by
+# SecurityMiddleware before the view runs
+ENDPOINT_POLICY = {
+    'api.home': (200, None),
+    'api.get_comments': (150, None),
+    'api.add_comment': (50, ('author', 'comment')),
+    'api.get_comment': (100, None),
+    'api.delete_comment': (30, None),
+    'api.get_weather': (60, None),
+    'api.api_demo': (80, None),
 }
 
-# Enable CORS
-CORS(app)
+# Shared HTTP session so upstream connections are pooled and kept alive
+http_session = requests.Session()
+http_session.headers['User-Agent'] = 'flask-comments-api/1.0.0'
+_http_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=Retry(total=0))
+http_session.mount('https://', _http_adapter)
+http_session.mount('http://', _http_adapter)
 
-# Setup logging
-logging.basicConfig(
-    level=getattr(logging, app.config['LOG_LEVEL']),
-    format='%(asctime)s %(levelname)s: %(message)s'
-)
+# (connect, read) timeouts for upstream calls
+UPSTREAM_TIMEOUT = (3.05, 10)
 
-# Rate limiting storage
-request_counts = {}
+# Upstream response caches holding pre-serialized JSON bodies
+weather_cache = TTLCache(maxsize=1024, ttl=60)
+api_demo_cache = TTLCache(maxsize=1, ttl=300)
 
-def rate_limit(max_requests=100, window=3600):
-    """Rate limiting decorator"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            if app.config['TESTING']:
-                return f(*args, **kwargs)
-                
-            client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
-            current_time = time.time()
-            window_start = current_time - window
-            
-            # Clean old requests
-            if client_ip in request_counts:
-                request_counts[client_ip] = [
-                    req_time for req_time in request_counts[client_ip] 
-                    if req_time > window_start
-                ]
-            else:
-                request_counts[client_ip] = []
-            
-            # Check rate limit
-            if len(request_counts[client_ip]) >= max_requests:
-                return jsonify({
-                    'error': 'Rate limit exceeded',
-                    'message': f'Maximum {max_requests} requests per hour'
-                }), 429
-            
-            request_counts[client_ip].append(current_time)
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
+# Comment lists longer than this are streamed in chunks of STREAM_CHUNK_ROWS
+# instead of being buffered into a single response body
+STREAM_THRESHOLD = 1000
+STREAM_CHUNK_ROWS = 500
 
-def validate_json(required_fields=None):
-    """JSON validation decorator"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            if not request.is_json:
-                return jsonify({'error': 'Content-Type must be application/json'}), 400
-            
-            data = request.get_json()
-            if data is None:
-                return jsonify({'error': 'Invalid JSON'}), 400
-            
-            if required_fields:
-                missing_fields = [field for field in required_fields if field not in data or not data[field]]
-                if missing_fields:
-                    return jsonify({
-                        'error': 'Missing required fields',
-                        'missing_fields': missing_fields
-                    }), 400
-            
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
+# Precompiled city name helpers
+_CITY_OK = re.compile(r"[a-zA-ZÀ-ÿ\s\-']+").fullmatch
+_CITY_STRIP = re.compile(r"[^a-zA-ZÀ-ÿ\s\-']").sub
 
-def sanitize_input(text):
-    """Sanitize user input"""
-    if not isinstance(text, str):
-        return text
-    
-    # Remove HTML tags and dangerous characters
-    text = html.escape(text)
-    text = re.sub(r'[<>"\']', '', text)
-    
-    # Limit length
-    if len(text) > 500:
-        text = text[:500]
-    
-    return text.strip()
-
-def validate_comment_data(data):
-    """Validate comment data"""
-    if not data.get('author') or not data.get('author').strip():
-        return {'valid': False, 'message': 'Author cannot be empty'}
-    
-    if not data.get('comment') or not data.get('comment').strip():
-        return {'valid': False, 'message': 'Comment cannot be empty'}
-    
-    if len(data['author']) > 100:
-        return {'valid': False, 'message': 'Author name too long (max 100 characters)'}
-    
-    if len(data['comment']) > 1000:
-        return {'valid': False, 'message': 'Comment too long (max 1000 characters)'}
-    
-    return {'valid': True}
+# Static response bodies, serialized once with the closing brace stripped so
+# the per-request timestamp can be appended
+_HOME_STATIC = orjson.dumps({
+    "message": "Flask Comments API",
+    "status": "running",
+    "version": "1.0.0",
+    "environment": os.environ.get('FLASK_ENV', 'production'),
+    "features": [
+        "Comments CRUD API",
+        "Weather integration", 
+        "Rate limiting",
+        "Input validation",
+        "Security headers"
+    ]
+})[:-1]
 
-# In-memory storage for comments
-comments_storage = [
-    {
-        "id": 1,
-        "author": "John Doe",
-        "comment": "This is a sample comment",
-        "timestamp": "2024-01-15T10:30:00Z"
-    },
-    {
-        "id": 2,
-        "author": "Jane Smith", 
-        "comment": "Another example comment",
-        "timestamp": "2024-01-15T11:00:00Z"
-    }
-]
+# Only the timestamp varies, so the home ETag is fixed for the process
+_HOME_ETAG = body_etag(_HOME_STATIC)
 
-# Global counter for comment IDs
-comment_counter = 2
+_HEALTH_STATIC = orjson.dumps({
+    "status": "healthy",
+    "uptime": "available",
+    "version": "1.0.0"
+})[:-1]
 
-@app.after_request
-def after_request(response):
-    """Add security headers to all responses"""
-    if app.config.get('SECURITY_HEADERS'):
-        for header, value in app.config['SECURITY_HEADERS'].items():
-            response.headers[header] = value
-    
-    response.headers['X-API-Version'] = '1.0.0'
-    response.headers['X-Timestamp'] = datetime.utcnow().isoformat()
-    
-    return response
-
-@app.route('/', methods=['GET'])
-@rate_limit(max_requests=200)
+@api.route('/', methods=['GET'])
+@cacheable(max_age=60, etag_func=lambda: _HOME_ETAG)
 def home():
     """Home endpoint that provides API information."""
-    return jsonify({
-        "message": "Flask Comments API",
-        "status": "running",
-        "version": "1.0.0",
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "environment": os.environ.get('FLASK_ENV', 'production'),
-        "features": [
-            "Comments CRUD API",
-            "Weather integration", 
-            "Rate limiting",
-            "Input validation",
-            "Security headers"
-        ]
-    }), 200
+    return make_timestamped_response(_HOME_STATIC), 200
 
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health():
     """Health check endpoint."""
-    return jsonify({
-        "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "uptime": "available",
-        "version": "1.0.0"
-    }), 200
+    return make_timestamped_response(_HEALTH_STATIC), 200
+
+def _stream_comments(rows):
+    """Yield the GET /comments JSON body in chunks"""
+    yield b'{"comments":['
+    for start in range(0, len(rows), STREAM_CHUNK_ROWS):
+        chunk = b','.join(rows[start:start + STREAM_CHUNK_ROWS])
+        yield chunk if start == 0 else b',' + chunk
+    yield b'],"total":' + str(len(rows)).encode() + b',"timestamp":"' + now_iso().encode() + b'"}'
 
-@app.route('/comments', methods=['GET'])
-@rate_limit(max_requests=150)
+@api.route('/comments', methods=['GET'])
+@cacheable(max_age=0, etag_func=lambda: comment_store.version)
 def get_comments():
     """Get all comments."""
     try:
-        app.logger.info(f"Fetching {len(comments_storage)} comments")
-        return jsonify({
-            "comments": comments_storage,
-            "total": len(comments_storage),
-            "timestamp": datetime.utcnow().isoformat() + "Z"
-        }), 200
+        total = len(comment_store)
+        current_app.logger.info("Fetching %d comments", total)
+        
+        if total > STREAM_THRESHOLD:
+            rows = comment_store.encoded_rows()
+            return current_app.response_class(_stream_comments(rows), mimetype='application/json'), 200
+        
+        static_body = b'{"comments":' + comment_store.encoded() + b',"total":' + str(total).encode()
+        return make_timestamped_response(static_body), 200
     except Exception as e:
-        app.logger.error(f"Error fetching comments: {str(e)}")
-        return jsonify({"error": "Failed to fetch comments"}), 500
+        current_app.logger.error("Error fetching comments: %s", e)
+        return make_json_response({"error": "Failed to fetch comments"}), 500
 
-@app.route('/comments', methods=['POST'])
-@rate_limit(max_requests=50)
-@validate_json(required_fields=['author', 'comment'])
+@api.route('/comments', methods=['POST'])
 def add_comment():
     """Add a new comment."""
-    global comment_counter
-    
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
         # Validate comment data
         validation_result = validate_comment_data(data)
         if not validation_result['valid']:
-            return jsonify({"error": validation_result['message']}), 400
+            return make_json_response({"error": validation_result['message']}), 400
         
-        # Sanitize input data
-        sanitized_author = sanitize_input(data['author'])
-        sanitized_comment = sanitize_input(data['comment'])
+        # Sanitize input data, in the string form that was validated
+        sanitized_author = sanitize_input(str(data['author']))
+        sanitized_comment = sanitize_input(str(data['comment']))
         
-        # Create new comment
-        comment_counter += 1
-        new_comment = {
-            "id": comment_counter,
-            "author": sanitized_author,
-            "comment": sanitized_comment,
-            "timestamp": datetime.utcnow().isoformat() + "Z"
-        }
+        new_comment = comment_store.add(sanitized_author, sanitized_comment)
+        current_app.logger.info("New comment added by %s", sanitized_author)
         
-        comments_storage.append(new_comment)
-        app.logger.info(f"New comment added by {sanitized_author}")
-        
-        return jsonify({
+        return make_json_response({
             "message": "Comment added successfully",
             "comment": new_comment
         }), 201
         
     except Exception as e:
-        app.logger.error(f"Error adding comment: {str(e)}")
-        return jsonify({"error": "Internal server error"}), 500
+        current_app.logger.error("Error adding comment: %s", e)
+        return make_json_response({"error": "Internal server error"}), 500
 
-@app.route('/comments/<int:comment_id>', methods=['GET'])
-@rate_limit(max_requests=100)
+@api.route('/comments/<int:comment_id>', methods=['GET'])
+@cacheable(max_age=0)
 def get_comment(comment_id):
     """Get a specific comment by ID."""
     try:
-        comment = next((c for c in comments_storage if c['id'] == comment_id), None)
+        comment = comment_store.get(comment_id)
         
         if not comment:
-            return jsonify({"error": "Comment not found"}), 404
+            return make_json_response({"error": "Comment not found"}), 404
         
-        app.logger.info(f"Fetched comment {comment_id}")
-        return jsonify(comment), 200
+        current_app.logger.info("Fetched comment %d", comment_id)
+        return make_json_response(comment), 200
         
     except Exception as e:
-        app.logger.error(f"Error fetching comment {comment_id}: {str(e)}")
-        return jsonify({"error": "Failed to fetch comment"}), 500
+        current_app.logger.error("Error fetching comment %d: %s", comment_id, e)
+        return make_json_response({"error": "Failed to fetch comment"}), 500
 
-@app.route('/comments/<int:comment_id>', methods=['DELETE'])
-@rate_limit(max_requests=30)
+@api.route('/comments/<int:comment_id>', methods=['DELETE'])
 def delete_comment(comment_id):
     """Delete a specific comment by ID."""
-    global comments_storage
-    
     try:
-        comment = next((c for c in comments_storage if c['id'] == comment_id), None)
+        comment = comment_store.delete(comment_id)
         
         if not comment:
-            return jsonify({"error": "Comment not found"}), 404
+            return make_json_response({"error": "Comment not found"}), 404
         
-        comments_storage = [c for c in comments_storage if c['id'] != comment_id]
-        app.logger.info(f"Deleted comment {comment_id}")
+        current_app.logger.info("Deleted comment %d", comment_id)
         
-        return jsonify({"message": f"Comment {comment_id} deleted successfully"}), 200
+        return make_json_response({"message": f"Comment {comment_id} deleted successfully"}), 200
         
     except Exception as e:
-        app.logger.error(f"Error deleting comment {comment_id}: {str(e)}")
-        return jsonify({"error": "Failed to delete comment"}), 500
+        current_app.logger.error("Error deleting comment %d: %s", comment_id, e)
+        return make_json_response({"error": "Failed to delete comment"}), 500
 
-@app.route('/weather/<city>', methods=['GET'])
-@rate_limit(max_requests=60)
+@api.route('/weather/<city>', methods=['GET'])
+@cacheable(max_age=60)
 def get_weather(city):
     """Demo weather endpoint that returns mock data."""
     try:
@@ -293,23 +187,32 @@ def get_weather(city):
         sanitized_city = sanitize_input(city)
         
         # Validate city name format
-        if not re.match(r"^[a-zA-ZÀ-ÿ\s\-']+$", sanitized_city):
-            sanitized_city = re.sub(r'[^a-zA-ZÀ-ÿ\s\-\']', '', sanitized_city)
+        if not _CITY_OK(sanitized_city):
+            sanitized_city = _CITY_STRIP('', sanitized_city)
         
-        api_key = app.config['WEATHER_API_KEY']
+        api_key = current_app.config['WEATHER_API_KEY']
         
         if api_key == 'demo-key':
-            # Return demo data
-            weather_data = {
+            # Return demo data; the ETag covers everything but the timestamp
+            static_body = orjson.dumps({
                 "city": sanitized_city,
                 "temperature": "22°C",
                 "description": "Sunny",
                 "humidity": "65%",
                 "wind_speed": "15 km/h",
-                "timestamp": datetime.utcnow().isoformat() + "Z",
                 "note": "This is demo data for testing purposes"
-            }
+            })[:-1]
+            current_app.logger.info("Weather data fetched for %s", sanitized_city)
+            response = make_timestamped_response(static_body)
+            response.set_etag(body_etag(static_body), weak=True)
+            return response, 200
         else:
+            cache_key = sanitized_city.lower()
+            body = weather_cache.get(cache_key)
+            if body is not None:
+                response = make_static_response(body)
+                return mark_cache_status(response, hit=True), 200
+            
             # Make real API call
             url = f"http://api.openweathermap.org/data/2.5/weather"
             params = {
@@ -319,41 +222,48 @@ def get_weather(city):
                 'lang': 'en'
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = http_session.get(url, params=params, timeout=UPSTREAM_TIMEOUT)
             
             if response.status_code == 200:
                 data = response.json()
-                weather_data = {
+                body = orjson.dumps({
                     "city": data['name'],
                     "temperature": f"{data['main']['temp']}°C",
                     "description": data['weather'][0]['description'],
                     "humidity": f"{data['main']['humidity']}%",
                     "country": data['sys']['country']
-                }
+                })
+                weather_cache.set(cache_key, body)
+                current_app.logger.info("Weather data fetched for %s", sanitized_city)
+                response = make_static_response(body)
+                return mark_cache_status(response, hit=False), 200
             else:
-                return jsonify({"error": "City not found"}), 404
-        
-        app.logger.info(f"Weather data fetched for {sanitized_city}")
-        return jsonify(weather_data), 200
+                return make_json_response({"error": "City not found"}), 404
         
     except requests.exceptions.RequestException as e:
-        app.logger.error(f"Weather API error: {str(e)}")
-        return jsonify({"error": f"Weather API error: {str(e)}"}), 500
+        current_app.logger.error("Weather API error: %s", e)
+        return make_json_response({"error": f"Weather API error: {str(e)}"}), 500
     except Exception as e:
-        app.logger.error(f"Weather endpoint error: {str(e)}")
-        return jsonify({"error": "Weather service unavailable"}), 500
+        current_app.logger.error("Weather endpoint error: %s", e)
+        return make_json_response({"error": "Weather service unavailable"}), 500
 
-@app.route('/api-demo', methods=['GET'])
-@rate_limit(max_requests=80)
+@api.route('/api-demo', methods=['GET'])
+@cacheable(max_age=300)
 def api_demo():
     """API demonstration endpoint."""
     try:
-        response = requests.get('https://jsonplaceholder.typicode.com/posts/1', timeout=10)
+        static_body = api_demo_cache.get('posts/1')
+        if static_body is not None:
+            response = make_timestamped_response(static_body)
+            response.set_etag(body_etag(static_body), weak=True)
+            return mark_cache_status(response, hit=True), 200
+        
+        response = http_session.get('https://jsonplaceholder.typicode.com/posts/1', timeout=UPSTREAM_TIMEOUT)
         
         if response.status_code == 200:
             data = response.json()
-            app.logger.info("API demo data fetched successfully")
-            return jsonify({
+            current_app.logger.info("API demo data fetched successfully")
+            static_body = orjson.dumps({
                 "message": "API Demo Endpoint",
                 "api_response": data,
                 "source": "jsonplaceholder.typicode.com",
@@ -363,49 +273,85 @@ def api_demo():
                     "Input validation",
                     "Security headers",
                     "Error handling"
-                ],
-                "timestamp": datetime.utcnow().isoformat() + "Z"
-            }), 200
+                ]
+            })[:-1]
+            api_demo_cache.set('posts/1', static_body)
+            response = make_timestamped_response(static_body)
+            response.set_etag(body_etag(static_body), weak=True)
+            return mark_cache_status(response, hit=False), 200
         else:
-            return jsonify({"error": "External API error"}), 500
+            return make_json_response({"error": "External API error"}), 500
             
     except Exception as e:
-        app.logger.error(f"API demo error: {str(e)}")
-        return jsonify({"error": "Demo service unavailable"}), 500
+        current_app.logger.error("API demo error: %s", e)
+        return make_json_response({"error": "Demo service unavailable"}), 500
+
+# Error handlers, with bodies serialized once since they never change
+_NOT_FOUND_BODY = orjson.dumps({
+    "error": "Not Found",
+    "message": "The requested resource was not found",
+    "status_code": 404
+})
 
-# Error handlers
-@app.errorhandler(404)
+_METHOD_NOT_ALLOWED_BODY = orjson.dumps({
+    "error": "Method Not Allowed",
+    "message": "The method is not allowed for the requested URL",
+    "status_code": 405
+})
+
+_INTERNAL_ERROR_BODY = orjson.dumps({
+    "error": "Internal Server Error",
+    "message": "An internal server error occurred",
+    "status_code": 500
+})
+
+@api.app_errorhandler(404)
 def not_found(error):
     """Handle 404 errors."""
-    return jsonify({
-        "error": "Not Found",
-        "message": "The requested resource was not found",
-        "status_code": 404
-    }), 404
+    return make_static_response(_NOT_FOUND_BODY), 404
 
-@app.errorhandler(405)
+@api.app_errorhandler(405)
 def method_not_allowed(error):
     """Handle 405 errors."""
-    return jsonify({
-        "error": "Method Not Allowed",
-        "message": "The method is not allowed for the requested URL",
-        "status_code": 405
-    }), 405
+    return make_static_response(_METHOD_NOT_ALLOWED_BODY), 405
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     """Handle 500 errors."""
-    app.logger.error(f"Internal server error: {str(error)}")
-    return jsonify({
-        "error": "Internal Server Error",
-        "message": "An internal server error occurred",
-        "status_code": 500
-    }), 500
+    current_app.logger.error("Internal server error: %s", error)
+    return make_static_response(_INTERNAL_ERROR_BODY), 500
+
+def create_app(config_name=None):
+    """Application factory."""
+    config_name = config_name or os.getenv('FLASK_ENV', 'development')
+    
+    config_class = config.get(config_name, config['default'])
+    
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    app.json = OrjsonProvider(app)
+    config_class.init_app(app)
+    
+    CORS(app, origins=app.config['CORS_ORIGINS'])
+    setup_logging(app)
+    SecurityMiddleware(app, endpoint_policy=ENDPOINT_POLICY)
+    app.register_blueprint(api)
+    
+    return app
+
+env = os.getenv('FLASK_ENV', 'development')
+app = create_app(env)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     debug = app.config.get('DEBUG', False)
     
+    if env == 'production':
+        app.logger.warning(
+            "Running the Flask development server in production; "
+            "use 'gunicorn --config gunicorn.conf.py wsgi:application' instead"
+        )
+    
     app.run(
         host='0.0.0.0',
         port=port,
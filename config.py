@@ -1,5 +1,4 @@
 import os
-from datetime import timedelta
 
 class Config:
     """Base configuration class."""
@@ -11,6 +10,9 @@ class Config:
     WEATHER_API_KEY = os.environ.get('WEATHER_API_KEY', 'demo-key')
     API_RATE_LIMIT = int(os.environ.get('API_RATE_LIMIT', '100'))
     
+    # Rate limit counters: memory:// (per worker) or redis://host:port/db (shared)
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL', 'memory://')
+    
     # Application Settings
     DEBUG = False
     TESTING = False
@@ -61,13 +63,6 @@ class ProductionConfig(Config):
     @classmethod
     def init_app(cls, app):
         Config.init_app(app)
-        
-        # Log to stderr in production
-        import logging
-        from logging import StreamHandler
-        file_handler = StreamHandler()
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
 
 # Configuration mapping
 config = {
@@ -0,0 +1,21 @@
+import multiprocessing
+import os
+
+# Server socket
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# Worker processes: 2 * CPU + 1 by default. gevent suits the upstream-bound
+# /weather and /api-demo endpoints; set GUNICORN_WORKER_CLASS=gthread to use
+# a thread pool per worker instead.
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+timeout = 120
+
+# Keep the worker heartbeat file in memory instead of on the container's disk
+worker_tmp_dir = '/dev/shm'
+
+# Logging
+accesslog = '-'
+errorlog = '-'
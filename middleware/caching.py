@@ -0,0 +1,53 @@
+from flask import request, current_app
+from functools import wraps
+from hashlib import blake2b
+
+def body_etag(body):
+    """Short content hash of a serialized body, for use as an ETag"""
+    return blake2b(body, digest_size=8).hexdigest()
+
+def _not_modified(etag, max_age):
+    """Build an empty 304 response carrying the validator headers"""
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+def cacheable(max_age=60, etag_func=None):
+    """HTTP caching decorator for GET views
+    
+    Adds a weak ETag and Cache-Control to 200 responses and answers 304 when
+    the client's If-None-Match matches. etag_func, called with the view
+    arguments, supplies the ETag without running the view. Otherwise an ETag
+    set by the view is used (views whose body embeds a timestamp hash only
+    the static part), falling back to a hash of the whole response body.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = None
+            if etag_func is not None:
+                etag = etag_func(**kwargs)
+                if request.if_none_match.contains_weak(etag):
+                    return _not_modified(etag, max_age)
+            
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            
+            if etag is None:
+                etag = response.get_etag()[0]
+                if etag is None:
+                    if response.is_streamed:
+                        return response
+                    etag = body_etag(response.get_data())
+                if request.if_none_match.contains_weak(etag):
+                    return _not_modified(etag, max_age)
+            
+            response.set_etag(etag, weak=True)
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            return response
+        return decorated_function
+    return decorator
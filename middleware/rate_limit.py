@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class MemoryBackend:
+    """Per-process approximate sliding-window counters
+    
+    Each (client, endpoint) key holds [window id, current count, previous
+    count, expires at]. An entry expires once it has been idle for two of its
+    own windows, at which point it no longer affects any estimate. Keys are
+    split into independently locked shards so concurrent requests from
+    different clients rarely contend on the same lock.
+    """
+    
+    def __init__(self, shards=16, max_tracked=10000):
+        self.shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self.max_per_shard = max(1, max_tracked // shards)
+    
+    def hit(self, key, max_requests, window):
+        """Record a request for key and return False if it exceeds the limit"""
+        current_time = time.time()
+        window_id = int(current_time // window)
+        lock, request_counts = self.shards[hash(key) % len(self.shards)]
+        
+        with lock:
+            entry = request_counts.get(key)
+            if entry is None:
+                # Sweep expired entries; least recently used order puts them at
+                # the front. Expiry is absolute time, so keys with different
+                # windows can share a shard without evicting each other early
+                while request_counts:
+                    if next(iter(request_counts.values()))[3] > current_time:
+                        break
+                    request_counts.popitem(last=False)
+                
+                entry = [window_id, 0, 0, 0]
+                request_counts[key] = entry
+                if len(request_counts) > self.max_per_shard:
+                    request_counts.popitem(last=False)
+            else:
+                request_counts.move_to_end(key)
+                if entry[0] != window_id:
+                    # Roll forward: the old current window becomes the previous
+                    # one only if it is directly adjacent
+                    entry[2] = entry[1] if entry[0] == window_id - 1 else 0
+                    entry[1] = 0
+                    entry[0] = window_id
+            
+            entry[3] = (window_id + 2) * window
+            
+            # Approximate sliding window: weight the previous window's count by
+            # how much of it still overlaps the trailing window
+            weight = 1 - (current_time % window) / window
+            if entry[2] * weight + entry[1] >= max_requests:
+                return False
+            
+            entry[1] += 1
+            return True
+    
+    def clear(self):
+        """Forget every tracked client"""
+        for lock, request_counts in self.shards:
+            with lock:
+                request_counts.clear()
+
+# Same approximate sliding-window counter as MemoryBackend, kept in one hash
+# per key (w = window id, c = current count, p = previous count). A single
+# EVAL reads, rolls, checks and increments atomically, and idle keys expire
+# after two windows.
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local max_requests = tonumber(ARGV[3])
+local window_id = math.floor(now / window)
+
+local state = redis.call('HMGET', key, 'w', 'c', 'p')
+local stored_id = tonumber(state[1])
+local curr = tonumber(state[2]) or 0
+local prev = tonumber(state[3]) or 0
+
+if stored_id ~= window_id then
+    if stored_id == window_id - 1 then
+        prev = curr
+    else
+        prev = 0
+    end
+    curr = 0
+end
+
+local weight = 1 - (now % window) / window
+local allowed = prev * weight + curr < max_requests
+if allowed then
+    curr = curr + 1
+elseif stored_id == window_id then
+    return 0
+end
+
+redis.call('HSET', key, 'w', window_id, 'c', curr, 'p', prev)
+redis.call('EXPIRE', key, 2 * math.ceil(window))
+if allowed then
+    return 1
+end
+return 0
+"""
+
+class RedisBackend:
+    """Rate-limit counters shared by every worker through Redis"""
+    
+    def __init__(self, url, prefix='rate_limit:'):
+        import redis
+        
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(SLIDING_WINDOW_SCRIPT)
+    
+    def hit(self, key, max_requests, window):
+        """Record a request for key and return False if it exceeds the limit"""
+        redis_key = self.prefix + ':'.join(map(str, key))
+        try:
+            return bool(self.script(keys=[redis_key], args=[time.time(), window, max_requests]))
+        except Exception as e:
+            # Fail open: an unreachable Redis must not take the API down
+            logger.warning("Rate limit backend error: %s", e)
+            return True
+    
+    def clear(self):
+        """Forget every tracked client"""
+        for redis_key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(redis_key)
+
+def create_rate_limit_backend(storage_url=None):
+    """Build the backend named by storage_url (redis://... or memory://)"""
+    if storage_url and storage_url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(storage_url)
+    return MemoryBackend()
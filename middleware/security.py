@@ -1,113 +1,107 @@
-from flask import request, jsonify, current_app
-from functools import wraps
-import time
-import re
-from datetime import datetime
+from flask import request, current_app
+from functools import lru_cache
 
-# Rate limiting storage
-request_counts = {}
+import orjson
+
+from utils.responses import make_json_response, make_static_response
+from middleware.rate_limit import create_rate_limit_backend
+from utils.timestamps import now_iso
 
 class SecurityMiddleware:
-    """Security middleware for Flask applications"""
+    """Security middleware for Flask applications
+    
+    endpoint_policy maps an endpoint name to a (max_requests, required_fields)
+    tuple. Both checks run in a single before_request hook, so the views need
+    no per-request decorator frames. Either element may be None.
+    """
     
-    def __init__(self, app=None):
+    def __init__(self, app=None, endpoint_policy=None):
+        self.endpoint_policy = endpoint_policy or {}
         if app is not None:
             self.init_app(app)
     
     def init_app(self, app):
         """Initialize security middleware with Flask app"""
+        # Static response headers, collected once instead of on every response
+        self.static_headers = list((app.config.get('SECURITY_HEADERS') or {}).items())
+        self.static_headers.append(('X-API-Version', '1.0.0'))
+        
+        app.extensions['rate_limit_backend'] = create_rate_limit_backend(
+            app.config.get('RATE_LIMIT_STORAGE_URL')
+        )
+        
+        if self.endpoint_policy:
+            app.before_request(self.enforce_endpoint_policy)
         app.after_request(self.add_security_headers)
+    
+    def enforce_endpoint_policy(self):
+        """Apply the rate limit and JSON checks configured for the endpoint"""
+        # CORS preflights are answered automatically and must not use up the quota
+        if request.method == 'OPTIONS':
+            return None
+        
+        policy = self.endpoint_policy.get(request.endpoint)
+        if policy is None:
+            return None
+        
+        max_requests, required_fields = policy
+        if max_requests and not current_app.config.get('TESTING'):
+            client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
+            error = check_rate_limit((client_ip, request.endpoint), max_requests)
+            if error is not None:
+                return error
+        
+        if required_fields is not None:
+            return check_json(required_fields)
+        
+        return None
 
     def add_security_headers(self, response):
         """Add security headers to responses"""
-        if current_app.config.get('SECURITY_HEADERS'):
-            for header, value in current_app.config['SECURITY_HEADERS'].items():
-                response.headers[header] = value
-        
-        response.headers['X-API-Version'] = '1.0.0'
-        response.headers['X-Timestamp'] = datetime.utcnow().isoformat()
+        response.headers.extend(self.static_headers)
+        response.headers.add('X-Timestamp', now_iso())
         
         return response
 
-def rate_limit(max_requests=100, window=3600):
-    """Rate limiting decorator"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            # Skip rate limiting in testing
-            if current_app.config.get('TESTING'):
-                return f(*args, **kwargs)
-                
-            client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
-            current_time = time.time()
-            window_start = current_time - window
-            
-            # Clean old requests
-            if client_ip in request_counts:
-                request_counts[client_ip] = [
-                    req_time for req_time in request_counts[client_ip] 
-                    if req_time > window_start
-                ]
-            else:
-                request_counts[client_ip] = []
-            
-            # Check rate limit
-            if len(request_counts[client_ip]) >= max_requests:
-                return jsonify({
-                    'error': 'Rate limit exceeded',
-                    'message': f'Maximum {max_requests} requests per hour'
-                }), 429
-            
-            request_counts[client_ip].append(current_time)
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
-
-def validate_json(required_fields=None):
-    """JSON validation decorator"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            if not request.is_json:
-                return jsonify({'error': 'Content-Type must be application/json'}), 400
-            
-            data = request.get_json()
-            if data is None:
-                return jsonify({'error': 'Invalid JSON'}), 400
-            
-            if required_fields:
-                missing_fields = [field for field in required_fields if field not in data or not data[field]]
-                if missing_fields:
-                    return jsonify({
-                        'error': 'Missing required fields',
-                        'missing_fields': missing_fields
-                    }), 400
-            
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
+@lru_cache(maxsize=None)
+def _rate_limit_body(max_requests):
+    """Serialized 429 body for a given limit; there is one per configured limit"""
+    return orjson.dumps({
+        'error': 'Rate limit exceeded',
+        'message': f'Maximum {max_requests} requests per hour'
+    })
 
-def sanitize_input(text):
-    """Sanitize user input by removing dangerous characters"""
-    if not isinstance(text, str):
-        return text
-    
-    # Remove HTML tags and dangerous characters
-    text = re.sub(r'[<>"\']', '', text)
+def check_rate_limit(key, max_requests, window=3600):
+    """Record a request for key; return a 429 response if over the limit, else None"""
+    backend = current_app.extensions['rate_limit_backend']
+    limited = not backend.hit(key, max_requests, window)
     
-    # Limit length
-    if len(text) > 500:
-        text = text[:500]
+    if limited:
+        return make_static_response(_rate_limit_body(max_requests)), 429
     
-    return text.strip()
+    return None
 
-def add_security_headers(response):
-    """Add security headers to responses"""
-    if current_app.config.get('SECURITY_HEADERS'):
-        for header, value in current_app.config['SECURITY_HEADERS'].items():
-            response.headers[header] = value
+def check_json(required_fields=None):
+    """Return a 400 response if the request body is not valid JSON with required_fields, else None"""
+    if not request.is_json:
+        return make_json_response({'error': 'Content-Type must be application/json'}), 400
     
-    response.headers['X-API-Version'] = '1.0.0'
-    response.headers['X-Timestamp'] = datetime.utcnow().isoformat()
+    # Parsed once and cached on the request for the view to reuse
+    data = request.get_json(silent=True, cache=True)
+    if data is None:
+        return make_json_response({'error': 'Invalid JSON'}), 400
+    
+    if required_fields:
+        lookup = data.get if isinstance(data, dict) else {}.get
+        # Common case: every field present and non-empty, checked in C
+        if all(map(lookup, required_fields)):
+            return None
+        
+        missing_fields = [field for field in required_fields if not lookup(field)]
+        if missing_fields:
+            return make_json_response({
+                'error': 'Missing required fields',
+                'missing_fields': missing_fields
+            }), 400
     
-    return response
\ No newline at end of file
+    return None
@@ -0,0 +1,105 @@
+import itertools
+import os
+import threading
+from dataclasses import dataclass
+
+import orjson
+
+from utils.timestamps import now_iso
+
+@dataclass(slots=True, frozen=True)
+class Comment:
+    """A single stored comment; orjson serializes it natively"""
+    
+    id: int
+    author: str
+    comment: str
+    timestamp: str
+
+class CommentStore:
+    """In-memory comment storage indexed by id
+    
+    Each comment is JSON-encoded once when stored, and the encoded list is
+    cached until the next add or delete so listing never re-encodes rows.
+    The version string changes on every write and serves as the list ETag.
+    Writes and the lazy fill of the encoded list share a lock, so a list
+    built before a write can never be cached after it.
+    """
+    
+    def __init__(self, comments=()):
+        self._lock = threading.Lock()
+        self.load(comments)
+    
+    def load(self, comments):
+        """Replace all stored comments; new ids continue after the highest loaded id"""
+        with self._lock:
+            self._comments = {comment['id']: Comment(**comment) for comment in comments}
+            self._rows = {comment_id: orjson.dumps(c) for comment_id, c in self._comments.items()}
+            self._encoded = None
+            self._ids = itertools.count(max(self._comments, default=0) + 1)
+            # Random per-load prefix keeps versions from different processes apart
+            self._epoch = os.urandom(4).hex()
+            self._generation = 0
+    
+    @property
+    def version(self):
+        """Opaque identifier that changes whenever the stored comments change"""
+        return f"{self._epoch}-{self._generation}"
+    
+    def encoded_rows(self):
+        """Return a snapshot list of every comment JSON-encoded as bytes"""
+        return list(self._rows.values())
+    
+    def encoded(self):
+        """Return every comment as a JSON array in bytes"""
+        encoded = self._encoded
+        if encoded is None:
+            with self._lock:
+                encoded = self._encoded
+                if encoded is None:
+                    encoded = self._encoded = b'[' + b','.join(self._rows.values()) + b']'
+        return encoded
+    
+    def get(self, comment_id):
+        """Return the comment with the given id, or None"""
+        return self._comments.get(comment_id)
+    
+    def add(self, author, comment):
+        """Store a new comment and return it"""
+        with self._lock:
+            comment_id = next(self._ids)
+            new_comment = Comment(comment_id, author, comment, now_iso())
+            self._comments[comment_id] = new_comment
+            self._rows[comment_id] = orjson.dumps(new_comment)
+            self._encoded = None
+            self._generation += 1
+        return new_comment
+    
+    def delete(self, comment_id):
+        """Remove and return the comment with the given id, or None"""
+        with self._lock:
+            comment = self._comments.pop(comment_id, None)
+            if comment is not None:
+                del self._rows[comment_id]
+                self._encoded = None
+                self._generation += 1
+        return comment
+    
+    def __len__(self):
+        return len(self._comments)
+
+# Shared store, seeded with sample comments
+comment_store = CommentStore([
+    {
+        "id": 1,
+        "author": "John Doe",
+        "comment": "This is a sample comment",
+        "timestamp": "2024-01-15T10:30:00Z"
+    },
+    {
+        "id": 2,
+        "author": "Jane Smith",
+        "comment": "Another example comment",
+        "timestamp": "2024-01-15T11:00:00Z"
+    }
+])
@@ -0,0 +1,36 @@
+import pytest
+
+from app import create_app
+from store import comment_store
+
+# Seed rows restored before each test
+SEED_COMMENTS = (
+    {
+        "id": 1,
+        "author": "Test User",
+        "comment": "Test comment",
+        "timestamp": "2024-01-15T10:30:00Z"
+    },
+    {
+        "id": 2,
+        "author": "Another User",
+        "comment": "Another test comment",
+        "timestamp": "2024-01-15T11:30:00Z"
+    }
+)
+
+@pytest.fixture(scope='session')
+def app():
+    """Application built once for the whole test session."""
+    return create_app('testing')
+
+@pytest.fixture(scope='session')
+def client(app):
+    """Test client shared by every test."""
+    return app.test_client()
+
+@pytest.fixture(autouse=True)
+def reset_comments():
+    """Reset comments storage to a known state before each test."""
+    comment_store.load(SEED_COMMENTS)
+    yield
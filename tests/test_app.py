@@ -1,281 +1,424 @@
-import unittest
-import json
-import sys
-import os
+import pytest
 
-# Add the parent directory to the path so we can import the app
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Endpoint tests; the app, client and per-test data reset live in conftest.py
 
-from app import app, comments_storage
-
-class FlaskAppTestCase(unittest.TestCase):
-    """Test suite for the main Flask application endpoints."""
-    
-    def setUp(self):
-        """Set up test client and reset data before each test."""
-        # Configure app for testing
-        app.config['TESTING'] = True
-        app.config['DEBUG'] = False
-        self.client = app.test_client()
-        
-        # Reset comments storage to a known state
-        comments_storage.clear()
-        comments_storage.extend([
+@pytest.mark.parametrize('path, status, expected_keys, expected_values', [
+    ('/', 200, {'message', 'status', 'features', 'timestamp'}, {
+        'status': 'running',
+        'features': [
+            'Comments CRUD API',
+            'Weather integration',
+            'Rate limiting',
+            'Input validation',
+            'Security headers'
+        ]
+    }),
+    ('/health', 200, {'status', 'timestamp', 'version'}, {'status': 'healthy'}),
+    ('/comments', 200, {'comments', 'total', 'timestamp'}, {
+        'total': 2,
+        'comments': [
             {
-                "id": 1,
-                "author": "Test User",
-                "comment": "Test comment",
-                "timestamp": "2024-01-15T10:30:00Z"
+                'id': 1,
+                'author': 'Test User',
+                'comment': 'Test comment',
+                'timestamp': '2024-01-15T10:30:00Z'
             },
             {
-                "id": 2,
-                "author": "Another User",
-                "comment": "Another test comment",
-                "timestamp": "2024-01-15T11:30:00Z"
+                'id': 2,
+                'author': 'Another User',
+                'comment': 'Another test comment',
+                'timestamp': '2024-01-15T11:30:00Z'
             }
-        ])
-        
-        # Reset comment counter
-        import app as app_module
-        app_module.comment_counter = 2
-    
-    def test_home_endpoint(self):
-        """Test the home endpoint returns correct data."""
-        response = self.client.get('/')
-        self.assertEqual(response.status_code, 200)
-        
-        data = json.loads(response.data)
-        self.assertIn('message', data)
-        self.assertIn('status', data)
-        self.assertIn('features', data)
-        self.assertEqual(data['status'], 'running')
-        self.assertIsInstance(data['features'], list)
-    
-    def test_health_endpoint(self):
-        """Test the health check endpoint works properly."""
-        response = self.client.get('/health')
-        self.assertEqual(response.status_code, 200)
-        
-        data = json.loads(response.data)
-        self.assertEqual(data['status'], 'healthy')
-        self.assertIn('timestamp', data)
-        self.assertIn('version', data)
-    
-    def test_security_headers(self):
-        """Test that security headers are present in responses."""
-        response = self.client.get('/')
-        self.assertIn('X-API-Version', response.headers)
-        self.assertIn('X-Timestamp', response.headers)
-        self.assertEqual(response.headers['X-API-Version'], '1.0.0')
-    
-    def test_get_comments(self):
-        """Test getting all comments returns the right format."""
-        response = self.client.get('/comments')
-        self.assertEqual(response.status_code, 200)
-        
-        data = json.loads(response.data)
-        self.assertIn('comments', data)
-        self.assertIn('total', data)
-        self.assertIn('timestamp', data)
-        self.assertEqual(data['total'], 2)
-        self.assertEqual(len(data['comments']), 2)
-    
-    def test_add_comment_valid(self):
-        """Test adding a new comment with valid data."""
-        new_comment = {
-            "author": "Test Author",
-            "comment": "This is a test comment"
-        }
-        
-        response = self.client.post('/comments',
-                                  data=json.dumps(new_comment),
-                                  content_type='application/json')
-        
-        self.assertEqual(response.status_code, 201)
-        
-        data = json.loads(response.data)
-        self.assertIn('message', data)
-        self.assertIn('comment', data)
-        self.assertEqual(data['comment']['author'], 'Test Author')
-        self.assertEqual(data['comment']['id'], 3)
-    
-    def test_add_comment_missing_fields(self):
-        """Test error handling when required fields are missing."""
-        invalid_comment = {"author": "Test Author"}  # Missing 'comment' field
-        
-        response = self.client.post('/comments',
-                                  data=json.dumps(invalid_comment),
-                                  content_type='application/json')
-        
-        self.assertEqual(response.status_code, 400)
-        
-        data = json.loads(response.data)
-        self.assertIn('error', data)
-        self.assertIn('missing_fields', data)
-        self.assertIn('comment', data['missing_fields'])
-    
-    def test_add_comment_invalid_json(self):
-        """Test error handling for invalid JSON data."""
-        response = self.client.post('/comments',
-                                  data="invalid json",
-                                  content_type='application/json')
-        
-        self.assertEqual(response.status_code, 400)
-        
-        data = json.loads(response.data)
-        self.assertIn('error', data)
-    
-    def test_add_comment_empty_values(self):
-        """Test that empty field values are rejected properly."""
-        empty_comment = {
-            "author": "",
-            "comment": ""
-        }
-        
-        response = self.client.post('/comments',
-                                  data=json.dumps(empty_comment),
-                                  content_type='application/json')
-        
-        self.assertEqual(response.status_code, 400)
-        
-        data = json.loads(response.data)
-        self.assertIn('error', data)
-    
-    def test_input_sanitization(self):
-        """Test that dangerous input is cleaned before saving."""
-        malicious_comment = {
-            "author": "Test<script>alert('xss')</script>",
-            "comment": "Comment with 'quotes' and <tags>"
-        }
-        
-        response = self.client.post('/comments',
-                                  data=json.dumps(malicious_comment),
-                                  content_type='application/json')
-        
-        self.assertEqual(response.status_code, 201)
-        
-        data = json.loads(response.data)
-        self.assertNotIn('<script>', data['comment']['author'])
-        self.assertNotIn('<tags>', data['comment']['comment'])
-        self.assertNotIn("'", data['comment']['comment'])
-    
-    def test_get_specific_comment(self):
-        """Test getting a single comment by its ID."""
-        response = self.client.get('/comments/1')
-        self.assertEqual(response.status_code, 200)
-        
-        data = json.loads(response.data)
-        self.assertEqual(data['id'], 1)
-        self.assertEqual(data['author'], 'Test User')
-    
-    def test_get_nonexistent_comment(self):
-        """Test that requesting a missing comment returns 404."""
-        response = self.client.get('/comments/999')
-        self.assertEqual(response.status_code, 404)
-        
-        data = json.loads(response.data)
-        self.assertIn('error', data)
-    
-    def test_delete_comment(self):
-        """Test deleting a comment removes it completely."""
-        # First check the comment exists
-        response = self.client.get('/comments/1')
-        self.assertEqual(response.status_code, 200)
-        
-        # Delete the comment
-        response = self.client.delete('/comments/1')
-        self.assertEqual(response.status_code, 200)
-        
-        data = json.loads(response.data)
-        self.assertIn('message', data)
-        
-        # Check the comment is gone
-        response = self.client.get('/comments/1')
-        self.assertEqual(response.status_code, 404)
-    
-    def test_delete_nonexistent_comment(self):
-        """Test deleting a comment that doesn't exist."""
-        response = self.client.delete('/comments/999')
-        self.assertEqual(response.status_code, 404)
-        
-        data = json.loads(response.data)
-        self.assertIn('error', data)
+        ]
+    }),
+    ('/api-demo', 200, {'message', 'api_response', 'source'}, {'source': 'jsonplaceholder.typicode.com'}),
+    ('/nonexistent', 404, {'error', 'message'}, {'status_code': 404}),
+], ids=['home', 'health', 'comments', 'api-demo', 'not-found'])
+def test_get_endpoint_shape(client, path, status, expected_keys, expected_values):
+    """Test that GET endpoints return the expected status and body."""
+    response = client.get(path)
+    assert response.status_code == status
     
-    def test_api_demo_endpoint(self):
-        """Test the API demo endpoint works correctly."""
-        response = self.client.get('/api-demo')
-        self.assertEqual(response.status_code, 200)
-        
-        data = json.loads(response.data)
-        self.assertIn('message', data)
-        self.assertIn('api_response', data)
-        self.assertIn('source', data)
-        self.assertEqual(data['source'], 'jsonplaceholder.typicode.com')
-    
-    def test_weather_endpoint_demo(self):
-        """Test the weather demo endpoint returns mock data."""
-        response = self.client.get('/weather/Madrid')
-        self.assertEqual(response.status_code, 200)
-        
-        data = json.loads(response.data)
-        self.assertIn('city', data)
-        self.assertIn('temperature', data)
-        self.assertIn('note', data)
-        self.assertEqual(data['city'], 'Madrid')
-    
-    def test_weather_endpoint_sanitization(self):
-        """Test that city names are cleaned in weather endpoint."""
-        response = self.client.get('/weather/Madrid<script>')
-        self.assertEqual(response.status_code, 200)
-        
-        data = json.loads(response.data)
-        self.assertNotIn('<script>', data['city'])
+    data = response.get_json()
+    assert expected_keys <= data.keys()
+    for key, value in expected_values.items():
+        assert data[key] == value
+
+def test_security_headers(client):
+    """Test that security headers are present in responses."""
+    response = client.get('/')
+    assert 'X-API-Version' in response.headers
+    assert 'X-Timestamp' in response.headers
+    assert response.headers['X-API-Version'] == '1.0.0'
+
+def test_add_comment_valid(client):
+    """Test adding a new comment with valid data."""
+    new_comment = {
+        "author": "Test Author",
+        "comment": "This is a test comment"
+    }
     
-    def test_404_error_handler(self):
-        """Test that 404 errors are handled correctly."""
-        response = self.client.get('/nonexistent')
-        self.assertEqual(response.status_code, 404)
-        
-        data = json.loads(response.data)
-        self.assertIn('error', data)
-        self.assertIn('message', data)
-        self.assertEqual(data['status_code'], 404)
-    
-    def test_method_not_allowed(self):
-        """Test that wrong HTTP methods return 405 error."""
-        response = self.client.put('/comments')
-        self.assertEqual(response.status_code, 405)
-
-class ConfigTestCase(unittest.TestCase):
-    """Test suite for application configuration settings."""
-    
-    def test_development_config(self):
-        """Test that development config has debug enabled."""
-        # Set environment for development
-        os.environ['FLASK_ENV'] = 'development'
-        app.config['DEBUG'] = True
-        app.config['LOG_LEVEL'] = 'DEBUG'
-        
-        self.assertTrue(app.config['DEBUG'])
-        self.assertEqual(app.config['LOG_LEVEL'], 'DEBUG')
+    response = client.post('/comments', json=new_comment)
+    
+    assert response.status_code == 201
+    
+    data = response.get_json()
+    assert 'message' in data
+    assert 'comment' in data
+    assert data['comment']['author'] == 'Test Author'
+    assert data['comment']['id'] == 3
+
+def test_add_comment_missing_fields(client):
+    """Test error handling when required fields are missing."""
+    invalid_comment = {"author": "Test Author"}  # Missing 'comment' field
+    
+    response = client.post('/comments', json=invalid_comment)
+    
+    assert response.status_code == 400
+    
+    data = response.get_json()
+    assert 'error' in data
+    assert 'missing_fields' in data
+    assert 'comment' in data['missing_fields']
+
+def test_add_comment_invalid_json(client):
+    """Test error handling for invalid JSON data."""
+    response = client.post('/comments',
+                              data="invalid json",
+                              content_type='application/json')
+    
+    assert response.status_code == 400
+    
+    data = response.get_json()
+    assert 'error' in data
+
+def test_add_comment_non_object_json(client):
+    """Test that a JSON body that is not an object is rejected."""
+    response = client.post('/comments', json=["author", "comment"])
+
+    assert response.status_code == 400
+
+    data = response.get_json()
+    assert data['missing_fields'] == ['author', 'comment']
+
+def test_add_comment_empty_values(client):
+    """Test that empty field values are rejected properly."""
+    empty_comment = {
+        "author": "",
+        "comment": ""
+    }
+    
+    response = client.post('/comments', json=empty_comment)
+    
+    assert response.status_code == 400
+    
+    data = response.get_json()
+    assert 'error' in data
+
+def test_input_sanitization(client):
+    """Test that dangerous input is cleaned before saving."""
+    malicious_comment = {
+        "author": "Test<script>alert('xss')</script>",
+        "comment": "Comment with 'quotes' and <tags>"
+    }
+    
+    response = client.post('/comments', json=malicious_comment)
+    
+    assert response.status_code == 201
+    
+    data = response.get_json()
+    assert '<script>' not in data['comment']['author']
+    assert '<tags>' not in data['comment']['comment']
+    assert "'" not in data['comment']['comment']
+
+def test_non_string_fields_stored_as_strings(client):
+    """Test that non-string field values are saved in their validated string form."""
+    response = client.post('/comments', json={"author": 42, "comment": 3.5})
+
+    assert response.status_code == 201
+
+    data = response.get_json()
+    assert data['comment']['author'] == '42'
+    assert data['comment']['comment'] == '3.5'
+
+def test_get_specific_comment(client):
+    """Test getting a single comment by its ID."""
+    response = client.get('/comments/1')
+    assert response.status_code == 200
     
-    def test_testing_config(self):
-        """Test that testing config has correct test settings."""
+    data = response.get_json()
+    assert data['id'] == 1
+    assert data['author'] == 'Test User'
+
+def test_get_nonexistent_comment(client):
+    """Test that requesting a missing comment returns 404."""
+    response = client.get('/comments/999')
+    assert response.status_code == 404
+    
+    data = response.get_json()
+    assert 'error' in data
+
+def test_delete_comment(client):
+    """Test deleting a comment removes it completely."""
+    # First check the comment exists
+    response = client.get('/comments/1')
+    assert response.status_code == 200
+    
+    # Delete the comment
+    response = client.delete('/comments/1')
+    assert response.status_code == 200
+    
+    data = response.get_json()
+    assert 'message' in data
+    
+    # Check the comment is gone
+    response = client.get('/comments/1')
+    assert response.status_code == 404
+
+def test_delete_nonexistent_comment(client):
+    """Test deleting a comment that doesn't exist."""
+    response = client.delete('/comments/999')
+    assert response.status_code == 404
+    
+    data = response.get_json()
+    assert 'error' in data
+
+def test_weather_endpoint_demo(client):
+    """Test the weather demo endpoint returns mock data."""
+    response = client.get('/weather/Madrid')
+    assert response.status_code == 200
+    
+    data = response.get_json()
+    assert 'city' in data
+    assert 'temperature' in data
+    assert 'note' in data
+    assert data['city'] == 'Madrid'
+
+def test_weather_endpoint_sanitization(client):
+    """Test that city names are cleaned in weather endpoint."""
+    response = client.get('/weather/Madrid<script>')
+    assert response.status_code == 200
+    
+    data = response.get_json()
+    assert '<script>' not in data['city']
+
+def test_comments_etag_not_modified(client):
+    """Test that a matching If-None-Match on the comment list returns 304."""
+    response = client.get('/comments')
+    etag = response.headers['ETag']
+    assert 'Cache-Control' in response.headers
+    
+    response = client.get('/comments', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_comments_etag_changes_after_write(client):
+    """Test that adding a comment invalidates the comment list ETag."""
+    etag = client.get('/comments').headers['ETag']
+    
+    client.post('/comments', json={"author": "New", "comment": "Fresh"})
+    
+    response = client.get('/comments', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_rate_limit_exceeded(app, client):
+    """Test that requests over the endpoint limit are rejected with 429."""
+    app.config['TESTING'] = False
+    try:
+        # DELETE /comments/<id> allows 30 requests per hour
+        for _ in range(30):
+            response = client.delete('/comments/999')
+            assert response.status_code == 404
+        
+        response = client.delete('/comments/999')
+        assert response.status_code == 429
+        
+        data = response.get_json()
+        assert data['error'] == 'Rate limit exceeded'
+    finally:
         app.config['TESTING'] = True
-        app.config['SECRET_KEY'] = 'test-secret-key'
-        
-        self.assertTrue(app.config['TESTING'])
-        self.assertEqual(app.config['SECRET_KEY'], 'test-secret-key')
-    
-    def test_production_config(self):
-        """Test that production config is secure and optimized."""
-        # Set environment for production
-        os.environ['FLASK_ENV'] = 'production'
-        app.config['DEBUG'] = False
-        
-        self.assertFalse(app.config['DEBUG'])
-        self.assertIn('SECURITY_HEADERS', app.config)
+        app.extensions['rate_limit_backend'].clear()
+
+def test_method_not_allowed(client):
+    """Test that wrong HTTP methods return 405 error."""
+    response = client.put('/comments')
+    assert response.status_code == 405
+
+# Configuration tests
+
+def test_development_config(app, monkeypatch):
+    """Test that development config has debug enabled."""
+    # Set environment for development
+    monkeypatch.setenv('FLASK_ENV', 'development')
+    monkeypatch.setitem(app.config, 'DEBUG', True)
+    monkeypatch.setitem(app.config, 'LOG_LEVEL', 'DEBUG')
+    
+    assert app.config['DEBUG']
+    assert app.config['LOG_LEVEL'] == 'DEBUG'
+
+def test_testing_config(app, monkeypatch):
+    """Test that testing config has correct test settings."""
+    monkeypatch.setitem(app.config, 'TESTING', True)
+    monkeypatch.setitem(app.config, 'SECRET_KEY', 'test-secret-key')
+    
+    assert app.config['TESTING']
+    assert app.config['SECRET_KEY'] == 'test-secret-key'
+
+def test_production_config(app, monkeypatch):
+    """Test that production config is secure and optimized."""
+    # Set environment for production
+    monkeypatch.setenv('FLASK_ENV', 'production')
+    monkeypatch.setitem(app.config, 'DEBUG', False)
+    
+    assert not app.config['DEBUG']
+    assert 'SECURITY_HEADERS' in app.config
+
+def test_create_app_does_not_stack_log_handlers(app):
+    """Test that building another app replaces, not duplicates, the stdout handler."""
+    from app import create_app
+    
+    create_app('testing')
+    
+    installed = [h for h in app.logger.handlers if getattr(h, '_comments_api_handler', False)]
+    assert len(installed) == 1
+
+def test_rate_limit_sweep_respects_each_window():
+    """Test that a short-window key does not evict a live long-window counter."""
+    from middleware.rate_limit import MemoryBackend
+    
+    backend = MemoryBackend(shards=1)
+    for _ in range(5):
+        assert backend.hit(('1.2.3.4', 'slow'), 5, 3600)
+    
+    backend.hit(('5.6.7.8', 'fast'), 5, 60)
+    
+    assert not backend.hit(('1.2.3.4', 'slow'), 5, 3600)
+
+def test_weather_etag_ignores_timestamp(client, monkeypatch):
+    """Test that the weather ETag survives a timestamp change and yields 304."""
+    monkeypatch.setattr('utils.responses.now_iso', lambda: '2024-01-15T10:30:00Z')
+    etag = client.get('/weather/Madrid').headers['ETag']
+    
+    monkeypatch.setattr('utils.responses.now_iso', lambda: '2024-01-15T10:30:01Z')
+    response = client.get('/weather/Madrid', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+def test_single_comment_requires_revalidation(client):
+    """Test that single comments are not served from shared caches without revalidating."""
+    response = client.get('/comments/1')
+    assert response.cache_control.max_age == 0
+
+def test_api_demo_etag_ignores_timestamp(client, monkeypatch):
+    """Test that a cached api-demo body keeps its ETag across timestamps."""
+    from app import api_demo_cache
+    
+    api_demo_cache.set('posts/1', b'{"message":"API Demo Endpoint"')
+    try:
+        monkeypatch.setattr('utils.responses.now_iso', lambda: '2024-01-15T10:30:00Z')
+        etag = client.get('/api-demo').headers['ETag']
+        
+        monkeypatch.setattr('utils.responses.now_iso', lambda: '2024-01-15T10:30:01Z')
+        response = client.get('/api-demo', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+    finally:
+        api_demo_cache.clear()
+
+def test_get_comments_streamed(client, monkeypatch):
+    """Test that long comment lists stream as valid JSON across chunk boundaries."""
+    from store import comment_store
+    
+    monkeypatch.setattr('app.STREAM_THRESHOLD', 3)
+    monkeypatch.setattr('app.STREAM_CHUNK_ROWS', 2)
+    comment_store.load([
+        {"id": i, "author": f"User {i}", "comment": f"Comment {i}", "timestamp": "2024-01-15T10:30:00Z"}
+        for i in range(1, 6)
+    ])
+    
+    response = client.get('/comments')
+    assert response.status_code == 200
+    assert response.is_streamed
+    
+    data = response.get_json()
+    assert data['total'] == 5
+    assert [comment['id'] for comment in data['comments']] == [1, 2, 3, 4, 5]
+    assert 'timestamp' in data
 
-if __name__ == '__main__':
-    # Run all tests when script is executed directly
-    unittest.main()
\ No newline at end of file
+def test_preflight_not_rate_limited(app, client):
+    """Test that CORS preflights neither count towards nor are blocked by the limit."""
+    preflight_headers = {
+        'Origin': 'https://example.com',
+        'Access-Control-Request-Method': 'GET'
+    }
+    app.config['TESTING'] = False
+    try:
+        # GET /comments allows 150 requests per hour
+        for _ in range(150):
+            response = client.options('/comments', headers=preflight_headers)
+            assert response.status_code != 429
+        
+        for _ in range(150):
+            response = client.get('/comments')
+            assert response.status_code == 200
+        
+        response = client.options('/comments', headers=preflight_headers)
+        assert response.status_code != 429
+    finally:
+        app.config['TESTING'] = True
+        app.extensions['rate_limit_backend'].clear()
+
+def test_redis_backend_hit_key_and_fail_open(monkeypatch):
+    """Test the Redis key and script arguments, and that backend errors fail open."""
+    from middleware.rate_limit import RedisBackend
+    
+    calls = []
+    
+    def script(keys, args):
+        calls.append((keys, args))
+        return 0
+    
+    backend = RedisBackend.__new__(RedisBackend)
+    backend.prefix = 'rate_limit:'
+    backend.script = script
+    monkeypatch.setattr('middleware.rate_limit.time.time', lambda: 1700000000.5)
+    
+    assert not backend.hit(('1.2.3.4', 'api.get_comments'), 150, 3600)
+    assert calls == [(['rate_limit:1.2.3.4:api.get_comments'], [1700000000.5, 3600, 150])]
+    
+    def failing_script(keys, args):
+        raise ConnectionError('Redis unavailable')
+    
+    backend.script = failing_script
+    assert backend.hit(('1.2.3.4', 'api.get_comments'), 150, 3600)
+
+def test_redis_sliding_window_script(monkeypatch):
+    """Test the Lua sliding-window script: limit, window roll-over and key TTL."""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    from middleware.rate_limit import RedisBackend
+    
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr('redis.Redis.from_url', lambda url: fakeredis.FakeRedis(server=server))
+    backend = RedisBackend('redis://localhost:6379/0')
+    key = ('1.2.3.4', 'api.delete_comment')
+    
+    # Start of a window: nothing carried over from the previous one
+    window_start = 1700000000 // 3600 * 3600
+    monkeypatch.setattr('middleware.rate_limit.time.time', lambda: window_start)
+    for _ in range(30):
+        assert backend.hit(key, 30, 3600)
+    assert not backend.hit(key, 30, 3600)
+    assert backend.client.ttl('rate_limit:1.2.3.4:api.delete_comment') == 7200
+    
+    # Halfway through the next window half of the previous count still applies
+    monkeypatch.setattr('middleware.rate_limit.time.time', lambda: window_start + 5400)
+    for _ in range(15):
+        assert backend.hit(key, 30, 3600)
+    assert not backend.hit(key, 30, 3600)
+    
+    # Two windows later the old counts no longer count at all
+    monkeypatch.setattr('middleware.rate_limit.time.time', lambda: window_start + 3 * 3600)
+    assert backend.hit(key, 30, 3600)
+    
+    backend.clear()
+    assert not backend.client.keys('rate_limit:*')
@@ -0,0 +1,24 @@
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for jsonify and request.get_json"""
+    
+    # Same options as utils.responses.make_json_response
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+    
+    def dumps(self, obj, **kwargs):
+        """Serialize obj to a JSON string"""
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+    
+    def loads(self, s, **kwargs):
+        """Deserialize a JSON string or bytes"""
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        """Build a JSON response from orjson bytes without a str round trip"""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option),
+            mimetype=self.mimetype
+        )
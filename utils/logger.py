@@ -1,13 +1,27 @@
 import logging
-import json
 import sys
-from datetime import datetime
+import time
 from typing import Dict, Any
+
+import orjson
 from flask import current_app
+from flask.logging import default_handler
+
+from utils.timestamps import now_iso
 
 def setup_logging(app):
-    """Setup logging configuration for the Flask application"""
+    """Setup logging configuration for the Flask application
+    
+    Safe to call once per create_app(): every app built from this module
+    shares the "app" logger, so a handler installed by an earlier call is
+    replaced rather than stacked.
+    """
+    for existing in list(app.logger.handlers):
+        if getattr(existing, '_comments_api_handler', False):
+            app.logger.removeHandler(existing)
+    
     handler = logging.StreamHandler(sys.stdout)
+    handler._comments_api_handler = True
     
     if app.config.get('LOG_FORMAT') == 'json':
         handler.setFormatter(JSONFormatter())
@@ -16,15 +30,19 @@ def setup_logging(app):
             '%(asctime)s %(levelname)s: %(message)s'
         ))
     
+    app.logger.removeHandler(default_handler)
     app.logger.addHandler(handler)
     app.logger.setLevel(getattr(logging, app.config.get('LOG_LEVEL', 'INFO')))
 
+# UTC second-precision timestamp, matching utils.timestamps.now_iso
+_ISO_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
 class JSONFormatter(logging.Formatter):
     """Custom JSON formatter for structured logging"""
     
     def format(self, record):
         log_entry = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': time.strftime(_ISO_FORMAT, time.gmtime(record.created)),
             'level': record.levelname,
             'message': record.getMessage(),
             'module': record.module,
@@ -36,7 +54,7 @@ class JSONFormatter(logging.Formatter):
         if hasattr(record, 'extra_data'):
             log_entry.update(record.extra_data)
         
-        return json.dumps(log_entry)
+        return orjson.dumps(log_entry).decode()
 
 class APILogger:
     """Centralized logging for API operations"""
@@ -44,11 +62,14 @@ class APILogger:
     @staticmethod
     def log_security_event(event_type: str, details: Dict[str, Any]):
         """Log security-related events"""
-        if current_app:
-            current_app.logger.warning(f"Security event: {event_type}", extra={
-                'extra_data': {
-                    'event_type': event_type,
-                    'timestamp': datetime.utcnow().isoformat(),
-                    **details
-                }
-            })
\ No newline at end of file
+        if not current_app:
+            return
+        
+        logger = current_app.logger
+        if not logger.isEnabledFor(logging.WARNING):
+            return
+        
+        extra_data = details.copy()
+        extra_data['event_type'] = event_type
+        extra_data['timestamp'] = now_iso()
+        logger.warning("Security event: %s", event_type, extra={'extra_data': extra_data})
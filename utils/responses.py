@@ -0,0 +1,27 @@
+import orjson
+from flask import current_app
+
+from utils.timestamps import now_iso
+
+def make_json_response(obj):
+    """Serialize obj with orjson into a JSON response"""
+    return current_app.response_class(
+        orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z),
+        mimetype='application/json'
+    )
+
+def make_static_response(body):
+    """Wrap an already serialized JSON body in a response"""
+    return current_app.response_class(body, mimetype='application/json')
+
+def make_timestamped_response(static_body):
+    """Append the current timestamp to a pre-serialized JSON object body"""
+    return current_app.response_class(
+        static_body + b',"timestamp":"' + now_iso().encode() + b'"}',
+        mimetype='application/json'
+    )
+
+def mark_cache_status(response, hit):
+    """Tag a response with whether it was served from an upstream cache"""
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
@@ -0,0 +1,12 @@
+import time
+
+# Cached (epoch_second, formatted) pair shared by every request in that second
+_ts_cache = [0, ""]
+
+def now_iso():
+    """Return the current UTC time as an ISO 8601 string with second precision"""
+    now = int(time.time())
+    if now != _ts_cache[0]:
+        _ts_cache[1] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now))
+        _ts_cache[0] = now
+    return _ts_cache[1]